@@ -0,0 +1,141 @@
+import { expect, test, describe, beforeAll, afterAll } from 'bun:test';
+import { connect } from 'bun';
+import { mkdtempSync, rmSync } from 'fs';
+import { tmpdir } from 'os';
+import { join } from 'path';
+import { HostBridge, type BridgeRequest } from './sandbox/bridge';
+
+// Must match FRAME_* in src/sandbox/shim.py
+const FRAME_STDOUT = 1;
+const FRAME_EXIT = 3;
+const FRAME_ERROR = 4;
+
+interface Frame {
+  type: number;
+  payload: Buffer;
+}
+
+function decodeFrames(data: Buffer): Frame[] {
+  const frames: Frame[] = [];
+  let offset = 0;
+  while (offset + 5 <= data.length) {
+    const type = data.readUInt8(offset);
+    const length = data.readUInt32BE(offset + 1);
+    frames.push({ type, payload: data.subarray(offset + 5, offset + 5 + length) });
+    offset += 5 + length;
+  }
+  expect(offset).toBe(data.length);
+  return frames;
+}
+
+async function runCommand(socketPath: string, request: BridgeRequest): Promise<Frame[]> {
+  const chunks: Buffer[] = [];
+  await new Promise<void>((resolve, reject) => {
+    connect({
+      unix: socketPath,
+      socket: {
+        open: (socket) => {
+          socket.write(JSON.stringify(request));
+        },
+        data: (_socket, data) => {
+          chunks.push(Buffer.from(data));
+        },
+        end: () => resolve(),
+        close: () => resolve(),
+        error: (_socket, error) => reject(error),
+      },
+    }).catch(reject);
+  });
+  return decodeFrames(Buffer.concat(chunks));
+}
+
+describe('HostBridge', () => {
+  const workspace = mkdtempSync(join(tmpdir(), 'bridge-test-'));
+  let bridge: HostBridge;
+
+  beforeAll(async () => {
+    // Keep host keys deterministic: no env keys, no ~/.local/share/opencode/auth.json
+    const overrides = ['HOME', 'GOOGLE_API_KEY', 'GOOGLE_GENERATIVE_AI_API_KEY'];
+    const saved = overrides.map((name) => process.env[name]);
+    process.env.HOME = workspace;
+    delete process.env.GOOGLE_API_KEY;
+    delete process.env.GOOGLE_GENERATIVE_AI_API_KEY;
+    try {
+      bridge = new HostBridge(workspace, undefined, { openai: 'test-openai-key' });
+    } finally {
+      overrides.forEach((name, i) => {
+        if (saved[i] === undefined) delete process.env[name];
+        else process.env[name] = saved[i];
+      });
+    }
+    await bridge.start();
+  });
+
+  afterAll(() => {
+    bridge.stop();
+    rmSync(workspace, { recursive: true, force: true });
+  });
+
+  test('should reject disallowed commands with an error frame', async () => {
+    const frames = await runCommand(bridge.getSocketPath(), {
+      command: 'rm',
+      args: ['-rf', '/'],
+      cwd: workspace,
+    });
+
+    expect(frames).toHaveLength(1);
+    expect(frames[0]!.type).toBe(FRAME_ERROR);
+    expect(frames[0]!.payload.toString()).toBe('Command rm not allowed');
+  });
+
+  test('should stream stdout frames followed by an exit frame', async () => {
+    const frames = await runCommand(bridge.getSocketPath(), {
+      command: 'git',
+      args: ['--version'],
+      cwd: workspace,
+    });
+
+    const stdout = Buffer.concat(
+      frames.filter((f) => f.type === FRAME_STDOUT).map((f) => f.payload),
+    ).toString();
+    expect(stdout).toStartWith('git version');
+
+    const last = frames[frames.length - 1]!;
+    expect(last.type).toBe(FRAME_EXIT);
+    expect(last.payload).toHaveLength(4);
+    expect(last.payload.readInt32BE(0)).toBe(0);
+  });
+
+  test('should forward a non-zero exit code in the exit frame', async () => {
+    const frames = await runCommand(bridge.getSocketPath(), {
+      command: 'git',
+      args: ['rev-parse', '--verify', 'nonexistent-ref'],
+      cwd: workspace,
+    });
+
+    const last = frames[frames.length - 1]!;
+    expect(last.type).toBe(FRAME_EXIT);
+    expect(last.payload.readInt32BE(0)).not.toBe(0);
+  });
+
+  test('should answer the proxy ping', async () => {
+    const res = await fetch('http://localhost/ping', { unix: bridge.getProxySocketPath() });
+    expect(res.status).toBe(200);
+    expect(await res.text()).toBe('PONG');
+  });
+
+  test('should only route whole provider path segments', async () => {
+    const res = await fetch('http://localhost/googlefoo/v1beta/models', {
+      unix: bridge.getProxySocketPath(),
+    });
+    expect(res.status).toBe(404);
+  });
+
+  test('should report a missing host key instead of proxying', async () => {
+    const res = await fetch('http://localhost/google/v1beta/models', {
+      unix: bridge.getProxySocketPath(),
+    });
+    expect(res.status).toBe(503);
+    expect(await res.text()).toBe('No google API key configured on host');
+  });
+});
@@ -1,9 +1,29 @@
-import { listen, spawn, type Socket, type SocketListener } from 'bun';
+import { listen, spawn, type Socket, type SocketListener, type Subprocess } from 'bun';
 import { existsSync, unlinkSync, mkdirSync, chmodSync, readFileSync } from 'fs';
 import { join } from 'path';
 import http from 'http';
 import https from 'https';
 
+// Inbound headers that must not be forwarded upstream. `connection: close`
+// from the sandbox would otherwise tear down pooled upstream sockets.
+const SKIPPED_PROXY_HEADERS = new Set(['host', 'connection', 'keep-alive', 'proxy-connection']);
+
+// Command bridge frame types: u8 type, u32 payload length, raw payload
+const FRAME_TYPES = { stdout: 1, stderr: 2, exit: 3, error: 4 } as const;
+type FrameType = keyof typeof FRAME_TYPES;
+
+interface ProxyRoute {
+  targetHost: string;
+  // Prepended to the forwarded path when missing (Google's `/v1beta`)
+  pathPrefix: string;
+  // Host and auth headers, laid over the inbound headers on every request
+  upstreamHeaders: http.OutgoingHttpHeaders;
+  // Also sent as the `key` query parameter (Google)
+  queryKey?: string;
+  // No host key was harvested; answered locally with 503
+  missingKey: boolean;
+}
+
 export interface BridgeRequest {
   command: string;
   args: string[];
@@ -14,6 +34,14 @@ export interface BridgeRequest {
 export class HostBridge {
   private commandListener: SocketListener<unknown> | null = null;
   private proxyServer: http.Server | null = null;
+  // Reuse TCP/TLS connections to the LLM providers across proxied requests
+  private upstreamAgent = new https.Agent({ keepAlive: true, maxFreeSockets: 64 });
+  // Bun's Socket.write does not buffer what it could not write. Frames for a
+  // socket are chained so stdout/stderr never interleave, and a short write
+  // waits for `drain` before sending the remainder.
+  private frameWrites = new WeakMap<Socket<unknown>, Promise<void>>();
+  private drainWaiters = new WeakMap<Socket<unknown>, () => void>();
+  private closedSockets = new WeakSet<Socket<unknown>>();
   private socketPath: string;
   private proxySocketPath: string;
   private workspacePath: string;
@@ -82,17 +110,22 @@ export class HostBridge {
             await this.handleRequest(socket, request);
           } catch (error) {
             console.error('[Bridge] Error handling data:', error);
-            socket.write(JSON.stringify({ type: 'error', message: String(error) }));
-            socket.end();
+            await this.endWithError(socket, String(error));
           }
         },
+        drain: (socket) => this.wakeWriter(socket),
+        close: (socket) => {
+          this.closedSockets.add(socket);
+          this.wakeWriter(socket);
+        },
       },
     });
     chmodSync(this.socketPath, 0o777);
 
     // 2. API Proxy
     if (existsSync(this.proxySocketPath)) unlinkSync(this.proxySocketPath);
-    const hostKeys = this.hostKeys;
+    const routes = this.buildProxyRoutes();
+    const upstreamAgent = this.upstreamAgent;
 
     this.proxyServer = http.createServer(async (req, res) => {
       try {
@@ -104,51 +137,39 @@ export class HostBridge {
           return;
         }
 
-        let targetHost: string | null = null;
-        let targetPath: string | null = null;
-        let authHeader: string | null = null;
-        let authValue: string | null = null;
-        let isGoogle = false;
-
-        if (url.pathname.startsWith('/google')) {
-          let path = url.pathname.replace('/google', '');
-          if (!path.startsWith('/v1beta')) path = '/v1beta' + path;
-          targetHost = 'generativelanguage.googleapis.com';
-          targetPath = path;
-          authHeader = 'x-goog-api-key';
-          authValue = hostKeys.google;
-          isGoogle = true;
-        } else if (url.pathname.startsWith('/openai')) {
-          targetHost = 'api.openai.com';
-          targetPath = url.pathname.replace('/openai', '');
-          authHeader = 'Authorization';
-          authValue = `Bearer ${hostKeys.openai}`;
-        } else if (url.pathname.startsWith('/anthropic')) {
-          targetHost = 'api.anthropic.com';
-          targetPath = url.pathname.replace('/anthropic', '');
-          authHeader = 'x-api-key';
-          authValue = hostKeys.anthropic;
-        }
+        // Dispatch on the first path segment: /<provider>/<upstream path>
+        const slash = url.pathname.indexOf('/', 1);
+        const segment = slash === -1 ? url.pathname.slice(1) : url.pathname.slice(1, slash);
+        const route = routes.get(segment);
 
-        if (targetHost && authValue) {
-          const finalPath = targetPath + url.search;
-          const finalUrl = new URL(`https://${targetHost}${finalPath}`);
-          if (isGoogle) finalUrl.searchParams.set('key', authValue);
+        if (route?.missingKey) {
+          res.writeHead(503, { 'content-type': 'text/plain' });
+          res.end(`No ${segment} API key configured on host`);
+        } else if (route) {
+          const { targetHost, pathPrefix, upstreamHeaders, queryKey } = route;
+          let targetPath = slash === -1 ? '' : url.pathname.slice(slash);
+          if (!targetPath.startsWith(pathPrefix)) targetPath = pathPrefix + targetPath;
+          if (queryKey) url.searchParams.set('key', queryKey);
+
+          const headers: http.OutgoingHttpHeaders = {};
+          for (const name in req.headers) {
+            if (!SKIPPED_PROXY_HEADERS.has(name)) headers[name] = req.headers[name];
+          }
+          Object.assign(headers, upstreamHeaders);
 
           const proxyReq = https.request(
             {
               hostname: targetHost,
               port: 443,
-              path: finalUrl.pathname + finalUrl.search,
+              agent: upstreamAgent,
+              path: targetPath + url.search,
               method: req.method,
-              headers: {
-                ...req.headers,
-                host: targetHost,
-                [authHeader.toLowerCase()]: authValue,
-              },
+              headers,
             },
             (proxyRes) => {
               res.writeHead(proxyRes.statusCode || 200, proxyRes.headers);
+              // Send headers now so SSE clients are not held until the first token
+              res.flushHeaders();
               proxyRes.pipe(res);
             },
           );
@@ -185,13 +206,51 @@ export class HostBridge {
     }
   }
 
+  /**
+   * Precomputes upstream host and auth headers for each provider prefix so the
+   * proxy hot path is a single map lookup.
+   */
+  private buildProxyRoutes(): Map<string, ProxyRoute> {
+    const { google, openai, anthropic } = this.hostKeys;
+    const googleHost = 'generativelanguage.googleapis.com';
+    const openaiHost = 'api.openai.com';
+    const anthropicHost = 'api.anthropic.com';
+    return new Map<string, ProxyRoute>([
+      [
+        'google',
+        {
+          targetHost: googleHost,
+          pathPrefix: '/v1beta',
+          upstreamHeaders: { host: googleHost, 'x-goog-api-key': google },
+          queryKey: google,
+          missingKey: !google,
+        },
+      ],
+      [
+        'openai',
+        {
+          targetHost: openaiHost,
+          pathPrefix: '',
+          upstreamHeaders: { host: openaiHost, authorization: `Bearer ${openai}` },
+          missingKey: !openai,
+        },
+      ],
+      [
+        'anthropic',
+        {
+          targetHost: anthropicHost,
+          pathPrefix: '',
+          upstreamHeaders: { host: anthropicHost, 'x-api-key': anthropic },
+          missingKey: !anthropic,
+        },
+      ],
+    ]);
+  }
+
   private async handleRequest(socket: Socket<unknown>, request: BridgeRequest) {
     const allowedCommands = ['gh', 'git'];
     if (!allowedCommands.includes(request.command)) {
-      socket.write(
-        JSON.stringify({ type: 'error', message: `Command ${request.command} not allowed` }),
-      );
-      socket.end();
+      await this.endWithError(socket, `Command ${request.command} not allowed`);
       return;
     }
 
@@ -201,8 +260,9 @@ export class HostBridge {
       mkdirSync(isolatedHome, { recursive: true });
     }
 
+    let proc: Subprocess | undefined;
     try {
-      const proc = spawn([commandPath, ...request.args], {
+      const child = spawn([commandPath, ...request.args], {
         cwd: existsSync(request.cwd) ? request.cwd : process.cwd(),
         env: {
           ...process.env,
@@ -216,15 +276,19 @@ export class HostBridge {
         stdout: 'pipe',
         stderr: 'pipe',
       });
+      proc = child;
 
-      const stdoutReader = this.streamToSocket(proc.stdout, socket, 'stdout');
-      const stderrReader = this.streamToSocket(proc.stderr, socket, 'stderr');
-      await Promise.all([proc.exited, stdoutReader, stderrReader]);
-      socket.write(JSON.stringify({ type: 'exit', code: 0 }));
+      const stdoutReader = this.streamToSocket(child.stdout, socket, 'stdout');
+      const stderrReader = this.streamToSocket(child.stderr, socket, 'stderr');
+      const [exitCode] = await Promise.all([child.exited, stdoutReader, stderrReader]);
+      const code = Buffer.alloc(4);
+      code.writeInt32BE(exitCode);
+      await this.writeFrame(socket, 'exit', code);
       socket.end();
     } catch (error) {
-      socket.write(JSON.stringify({ type: 'error', message: String(error) }));
-      socket.end();
+      // The shim may be gone (Ctrl-C, timeout); don't leave the child blocked on a full pipe
+      proc?.kill();
+      await this.endWithError(socket, String(error));
     }
   }
 
@@ -238,16 +302,65 @@ export class HostBridge {
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
-        socket.write(JSON.stringify({ type, data: Buffer.from(value).toString('base64') }) + '\n');
+        await this.writeFrame(socket, type, value);
       }
+    } catch (error) {
+      await reader.cancel().catch(() => {});
+      throw error;
     } finally {
       reader.releaseLock();
     }
   }
 
+  /**
+   * Writes a command bridge frame: u8 type, u32 payload length, raw payload.
+   * The shim dispatches on the type byte without parsing JSON.
+   */
+  private writeFrame(socket: Socket<unknown>, type: FrameType, payload: Uint8Array) {
+    const frame = Buffer.alloc(5 + payload.byteLength);
+    frame.writeUInt8(FRAME_TYPES[type], 0);
+    frame.writeUInt32BE(payload.byteLength, 1);
+    frame.set(payload, 5);
+
+    const previous = this.frameWrites.get(socket) ?? Promise.resolve();
+    const next = previous.then(() => this.writeAll(socket, frame));
+    this.frameWrites.set(socket, next);
+    return next;
+  }
+
+  private async writeAll(socket: Socket<unknown>, data: Buffer) {
+    let remaining = data;
+    while (remaining.length > 0) {
+      if (this.closedSockets.has(socket)) throw new Error('Bridge socket closed');
+      const written = socket.write(remaining);
+      if (written > 0) remaining = remaining.subarray(written);
+      if (remaining.length > 0) {
+        await new Promise<void>((resolve) => this.drainWaiters.set(socket, resolve));
+      }
+    }
+  }
+
+  private wakeWriter(socket: Socket<unknown>) {
+    const resolve = this.drainWaiters.get(socket);
+    if (resolve) {
+      this.drainWaiters.delete(socket);
+      resolve();
+    }
+  }
+
+  private async endWithError(socket: Socket<unknown>, message: string) {
+    try {
+      await this.writeFrame(socket, 'error', Buffer.from(message));
+    } catch {
+      // Socket already closed
+    }
+    socket.end();
+  }
+
   stop() {
     this.commandListener?.stop();
     this.proxyServer?.close();
+    this.upstreamAgent.destroy();
     if (existsSync(this.socketPath)) unlinkSync(this.socketPath);
     if (existsSync(this.proxySocketPath)) unlinkSync(this.proxySocketPath);
   }
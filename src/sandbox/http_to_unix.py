@@ -1,52 +1,162 @@
 import os
 import sys
 import socket
-import threading
-import time
+import asyncio
 
-# Reliable Threaded TCP-to-Unix Socket Bridge for OpenCode Sandbox
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Reliable asyncio TCP-to-Unix Socket Bridge for OpenCode Sandbox
 # Optimized for streaming (SSE) and robust cleanup
 
 PROXY_SOCK = os.environ.get("PROXY_SOCK")
+CHUNK_SIZE = 65536
+SOCK_BUF_SIZE = 262144
+PIPE_SIZE = 1 << 20
+ACCEPT_BACKOFF = 0.1
+CONNECT_BACKOFF = 0.005
+CONNECT_BACKOFF_MAX = 0.1
+CONNECT_TIMEOUT = 30
+
+# Linux: move bytes socket -> pipe -> socket in the kernel, never through Python
+USE_SPLICE = hasattr(os, "splice")
+if USE_SPLICE:
+    SPLICE_FLAGS = os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK
+
+
+# Linux: create sockets non-blocking in socket() itself instead of a later
+# fcntl; Python already opens every socket with SOCK_CLOEXEC
+SOCK_NONBLOCK = getattr(socket, "SOCK_NONBLOCK", 0)
+
+
+def nonblocking_socket(family):
+    if SOCK_NONBLOCK:
+        return socket.socket(family, socket.SOCK_STREAM | SOCK_NONBLOCK)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    return sock
+
+
+# Only for the Unix side: fixed sizes on TCP sockets would disable Linux autotuning
+def tune_buffers(sock):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUF_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCK_BUF_SIZE)
+
+
+async def wait_fd(add, remove, fd):
+    fut = asyncio.get_running_loop().create_future()
+    add(fd, lambda: fut.done() or fut.set_result(None))
+    try:
+        await fut
+    finally:
+        remove(fd)
 
 
-def pipe(source, target, label):
+async def connect_unix(sock, path):
+    # A non-blocking AF_UNIX connect fails with EAGAIN while the listener's
+    # backlog is full. asyncio's sock_connect mistakes that for "in progress"
+    # and reports success, so retry the connect itself instead.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CONNECT_TIMEOUT
+    delay = CONNECT_BACKOFF
+    while True:
+        try:
+            sock.connect(path)
+            return
+        except (BlockingIOError, InterruptedError):
+            if loop.time() >= deadline:
+                raise TimeoutError(f"{path} backlog stayed full")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CONNECT_BACKOFF_MAX)
+
+
+async def splice_pump(source, target):
+    loop = asyncio.get_running_loop()
+    src_fd, dst_fd = source.fileno(), target.fileno()
+    pipe_r, pipe_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
     try:
+        if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+            try:
+                fcntl.fcntl(pipe_w, fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+            except OSError:
+                pass
+
         while True:
-            data = source.recv(8192)
-            if not data:
+            try:
+                pending = os.splice(src_fd, pipe_w, PIPE_SIZE, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                await wait_fd(loop.add_reader, loop.remove_reader, src_fd)
+                continue
+            if not pending:
                 break
-            target.sendall(data)
-    except:
-        pass
+
+            # Drain the pipe completely so the next splice-in never blocks on it
+            while pending:
+                try:
+                    pending -= os.splice(pipe_r, dst_fd, pending, flags=SPLICE_FLAGS)
+                except BlockingIOError:
+                    await wait_fd(loop.add_writer, loop.remove_writer, dst_fd)
     finally:
-        try:
-            source.close()
-        except:
-            pass
-        try:
-            target.close()
-        except:
-            pass
+        os.close(pipe_r)
+        os.close(pipe_w)
+
 
+async def copy_pump(source, target):
+    loop = asyncio.get_running_loop()
+    view = memoryview(bytearray(CHUNK_SIZE))
+    while n := await loop.sock_recv_into(source, view):
+        await loop.sock_sendall(target, view[:n])
 
-def bridge_handler(tcp_conn, unix_sock_path):
+
+pump = splice_pump if USE_SPLICE else copy_pump
+
+
+async def bridge_handler(tcp_conn):
+    unix_conn = nonblocking_socket(socket.AF_UNIX)
+    tune_buffers(unix_conn)
     try:
-        unix_conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        unix_conn.connect(unix_sock_path)
-
-        # Start bidirectional piping
-        t1 = threading.Thread(
-            target=pipe, args=(tcp_conn, unix_conn, "T->U"), daemon=True
-        )
-        t2 = threading.Thread(
-            target=pipe, args=(unix_conn, tcp_conn, "U->T"), daemon=True
-        )
-
-        t1.start()
-        t2.start()
+        await connect_unix(unix_conn, PROXY_SOCK)
     except Exception:
+        unix_conn.close()
+        tcp_conn.close()
+        return
+
+    # Bidirectional piping; either side closing tears down both
+    tasks = [
+        asyncio.create_task(pump(tcp_conn, unix_conn)),
+        asyncio.create_task(pump(unix_conn, tcp_conn)),
+    ]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         tcp_conn.close()
+        unix_conn.close()
+
+
+async def serve(server_sock):
+    loop = asyncio.get_running_loop()
+    handlers = set()
+
+    while True:
+        try:
+            client_conn, _ = await loop.sock_accept(server_sock)
+        except OSError:
+            # e.g. EMFILE: back off instead of spinning on the listener
+            await asyncio.sleep(ACCEPT_BACKOFF)
+            continue
+        try:
+            client_conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            client_conn.close()
+            continue
+        task = asyncio.create_task(bridge_handler(client_conn))
+        handlers.add(task)
+        task.add_done_callback(handlers.discard)
 
 
 def main():
@@ -56,8 +166,10 @@ def main():
     start_port = int(sys.argv[1])
 
     # Robust Port Binding Logic
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server = nonblocking_socket(socket.AF_INET)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Disable Nagle so small SSE chunks are not coalesced (inherited on Linux)
+    server.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
     port = start_port
     max_retries = 20
@@ -78,14 +190,10 @@ def main():
     # Output the final port so entrypoint can read it if needed
     print(f"PORT:{port}", flush=True)
 
-    while True:
-        try:
-            client_conn, _ = server.accept()
-            bridge_handler(client_conn, PROXY_SOCK)
-        except KeyboardInterrupt:
-            break
-        except:
-            pass
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
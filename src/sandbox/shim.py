@@ -1,8 +1,23 @@
 import os
 import sys
 import socket
+import struct
 import json
-import base64
+
+# Frame prefix: u8 type, u32 payload length. JSON is only used for the request
+FRAME_PREFIX = struct.Struct(">BI")
+EXIT_CODE = struct.Struct(">i")
+FRAME_STDOUT, FRAME_STDERR, FRAME_EXIT, FRAME_ERROR = 1, 2, 3, 4
+# A larger length means the stream is out of sync; fail instead of allocating it
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def read_exact(reader, view):
+    # Small frames are served from the reader's buffer; large bodies are
+    # read straight into the caller's view
+    if reader.readinto(view) != len(view):
+        raise EOFError("bridge closed mid-frame")
+    return view
 
 
 def main():
@@ -22,34 +37,38 @@ def main():
         client.connect(socket_path)
         client.sendall(json.dumps(req).encode("utf-8"))
 
-        # Read response
-        buffer = ""
+        # Read response frames
+        reader = client.makefile("rb", buffering=65536)
+        # Reused across frames; only regrown for oversized payloads
+        buf = bytearray(65536)
         while True:
-            data = client.recv(4096)
-            if not data:
-                break
-            buffer += data.decode("utf-8")
-
-            while "\n" in buffer:
-                line, buffer = buffer.split("\n", 1)
-                if not line.strip():
-                    continue
-                try:
-                    msg = json.loads(line)
-                    if msg["type"] == "stdout":
-                        sys.stdout.buffer.write(base64.b64decode(msg["data"]))
-                        sys.stdout.buffer.flush()
-                    elif msg["type"] == "stderr":
-                        sys.stderr.buffer.write(base64.b64decode(msg["data"]))
-                        sys.stderr.buffer.flush()
-                    elif msg["type"] == "exit":
-                        sys.exit(msg["code"])
-                    elif msg["type"] == "error":
-                        print(f"[Shim Error] {msg['message']}", file=sys.stderr)
-                        sys.exit(1)
-                except Exception as e:
-                    # Partial JSON or other error
-                    pass
+            prefix = reader.read(FRAME_PREFIX.size)
+            if not prefix:
+                # Every command ends with an exit or error frame
+                raise EOFError("bridge closed before the command finished")
+            if len(prefix) < FRAME_PREFIX.size:
+                raise ValueError("corrupt bridge frame (truncated header)")
+            frame_type, length = FRAME_PREFIX.unpack(prefix)
+            if not FRAME_STDOUT <= frame_type <= FRAME_ERROR:
+                raise ValueError(f"corrupt bridge frame (type {frame_type})")
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"corrupt bridge frame ({length} byte payload)")
+            if length > len(buf):
+                buf = bytearray(length)
+            payload = read_exact(reader, memoryview(buf)[:length])
+
+            if frame_type == FRAME_STDOUT:
+                sys.stdout.buffer.write(payload)
+                sys.stdout.buffer.flush()
+            elif frame_type == FRAME_STDERR:
+                sys.stderr.buffer.write(payload)
+                sys.stderr.buffer.flush()
+            elif frame_type == FRAME_EXIT:
+                sys.exit(EXIT_CODE.unpack(payload)[0])
+            elif frame_type == FRAME_ERROR:
+                message = bytes(payload).decode("utf-8", "replace")
+                print(f"[Shim Error] {message}", file=sys.stderr)
+                sys.exit(1)
     except Exception as e:
         print(f"[Shim] Failed: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,73 @@
+import os
+import sys
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+BRIDGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_to_unix.py")
+
+
+class FullBacklogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.proxy_sock = os.path.join(self.tmp.name, "proxy.sock")
+
+        # Backlog of 1 and a slow first accept: later connects see EAGAIN
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.proxy_sock)
+        self.listener.listen(1)
+        threading.Thread(target=self.serve, daemon=True).start()
+
+        self.bridge = subprocess.Popen(
+            [sys.executable, BRIDGE, "18900"],
+            env={**os.environ, "PROXY_SOCK": self.proxy_sock},
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.port = int(self.bridge.stdout.readline().split(":")[1])
+
+    def tearDown(self):
+        self.bridge.kill()
+        self.bridge.wait()
+        self.bridge.stdout.close()
+        self.listener.close()
+        self.tmp.cleanup()
+
+    def serve(self):
+        time.sleep(0.5)
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.reply, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def reply(conn):
+        with conn:
+            if conn.recv(64) == b"ping":
+                conn.sendall(b"pong")
+
+    def request(self, results, i):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=10) as conn:
+            conn.sendall(b"ping")
+            results[i] = conn.recv(64)
+
+    def test_all_clients_answered_when_backlog_is_full(self):
+        results = [None] * 6
+        threads = [
+            threading.Thread(target=self.request, args=(results, i))
+            for i in range(len(results))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [b"pong"] * len(results))
+
+
+if __name__ == "__main__":
+    unittest.main()